@@ -6,7 +6,7 @@ import numpy as np
 # Import our modules
 from data_utils import load_data, prepare_data_for_models
 from model_utils import load_prediction_models, make_predictions
-from optimization import optimize_with_v2g, optimize_without_v2g
+from optimization import optimize_with_v2g, optimize_without_v2g, render_optimization_details
 from visualization import (
     plot_predictions_with_historical,
     plot_optimization_results,
@@ -78,70 +78,10 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("*© 2025 V2G Energy Optimization*")
 
-# Main content
-tab1, tab2, tab3 = st.tabs(["Dashboard", "Detailed Analysis", "Reports"])
-
-with tab1:
-    # Load data and models
-    with st.spinner("Loading data and models..."):
-        load_df, solar_energy_df, ev_dispo_df = load_data()
-        grid_load_model, solar_energy_model, ev_model = load_prediction_models()
-        
-        if load_df is not None and solar_energy_df is not None and ev_dispo_df is not None:
-            # Prepare data for models
-            time_steps = 15
-            X_test_load, X_test_solar, X_test_ev, scaler_y, historical_data, last_date = prepare_data_for_models(
-                load_df, solar_energy_df, ev_dispo_df, time_steps, forecast_days
-            )
-
-    # Setup app state for storing results
-    if 'results' not in st.session_state:
-        st.session_state.results = None
-    
-    # Auto-run analysis
-    with st.spinner("Running analysis..."):
-        # Make predictions
-        load_pred, solar_energy_pred, ev_pred_inv, date_range = make_predictions(
-            forecast_days, X_test_load, X_test_solar, X_test_ev, scaler_y,
-            grid_load_model, solar_energy_model, ev_model, last_date
-        )
-        
-        # Run optimization
-        hours = len(load_pred)
-        
-        # Run optimization with V2G
-        results_with_v2g = optimize_with_v2g(
-            load_pred.flatten(), 
-            solar_energy_pred.flatten(), 
-            ev_pred_inv.flatten(), 
-            hours, 
-            v2g_price, 
-            diesel_price,
-            max_v2g_hours
-        )
-        
-        # Run optimization without V2G
-        results_without_v2g = optimize_without_v2g(
-            load_pred.flatten(), 
-            solar_energy_pred.flatten(), 
-            hours, 
-            diesel_price
-        )
-        
-        # Store results in session state
-        st.session_state.results = {
-            "load_pred": load_pred,
-            "solar_energy_pred": solar_energy_pred,
-            "ev_pred_inv": ev_pred_inv,
-            "date_range": date_range,
-            "results_with_v2g": results_with_v2g,
-            "results_without_v2g": results_without_v2g,
-            "forecast_days": forecast_days,
-            "historical_data": historical_data
-        }
-    
+@st.fragment
+def render_dashboard(results):
+    """Render the KPI cards and charts of the Dashboard tab."""
     # Use stored results
-    results = st.session_state.results
     load_pred = results["load_pred"]
     solar_energy_pred = results["solar_energy_pred"]
     ev_pred_inv = results["ev_pred_inv"]
@@ -157,7 +97,7 @@ with tab1:
     if results_with_v2g and results_without_v2g:
         col1, col2, col3, col4 = st.columns(4)
         
-        total_load = float(sum(load_pred.flatten()))
+        total_load = float(load_pred.sum())
         cost_savings = results_without_v2g['total_cost'] - results_with_v2g['total_cost']
         percent_savings = (cost_savings / results_without_v2g['total_cost']) * 100 if results_without_v2g['total_cost'] > 0 else 0
         diesel_reduction = results_without_v2g['total_diesel_energy'] - results_with_v2g['total_diesel_energy']
@@ -226,120 +166,203 @@ with tab1:
             )
             st.plotly_chart(cost_chart, use_container_width=True)
 
+@st.fragment
+def render_detailed_analysis(results, diesel_price, v2g_price):
+    """Render the V2G usage and hourly breakdown of the Detailed Analysis tab."""
+    st.markdown("## V2G Usage Analysis")
+    
+    # V2G usage analysis
+    if results["results_with_v2g"]:
+        v2g_usage = np.asarray(results["results_with_v2g"]['v2g_used'])
+        significant_v2g = v2g_usage > 0.1  # Using 0.1 MW as threshold
+        
+        if significant_v2g.any():
+            # Resolve the mask to positions once and take from each array
+            idx = np.flatnonzero(significant_v2g)
+            v2g_dates = results["date_range"].take(idx)
+            v2g_values = np.take(v2g_usage, idx)
+            v2g_load = np.take(results["load_pred"].ravel(), idx)
+            
+            # V2G usage chart
+            v2g_fig = plot_v2g_usage(v2g_dates, v2g_values, v2g_load)
+            st.plotly_chart(v2g_fig, use_container_width=True)
+            
+            # V2G usage table
+            st.markdown("### Peak Hours When V2G is Used")
+            peak_v2g_df = pd.DataFrame({
+                "Date": v2g_dates,
+                "Hour": v2g_dates.hour,
+                "Load (MW)": v2g_load,
+                "V2G Used (MW)": v2g_values
+            })
+            st.dataframe(peak_v2g_df, use_container_width=True)
+        else:
+            st.info("No significant V2G usage detected in this forecast period.")
+    
+    st.markdown("## Hourly Energy Analysis")
+    
+    if results["results_with_v2g"] and results["results_without_v2g"]:
+        with_v2g = results["results_with_v2g"]
+        without_v2g = results["results_without_v2g"]
+        
+        # Derived columns as plain numpy arithmetic, then one DataFrame build
+        diesel_with = with_v2g["diesel_used"]
+        diesel_without = without_v2g["diesel_used"]
+        diesel_cost_with = diesel_with * diesel_price
+        diesel_cost_without = diesel_without * diesel_price
+        v2g_cost = with_v2g["v2g_used"] * v2g_price
+        
+        # Create detailed hourly comparison dataframe
+        hourly_data = pd.DataFrame({
+            "Date": results["date_range"],
+            "Hour": results["date_range"].hour,
+            "Load (MW)": results["load_pred"].ravel(),
+            "Solar Generation (MW)": results["solar_energy_pred"].ravel(),
+            "EV Available (MW)": results["ev_pred_inv"].ravel(),
+            "Solar Used (with V2G) (MW)": with_v2g["solar_used"],
+            "V2G Used (MW)": with_v2g["v2g_used"],
+            "Diesel Used (with V2G) (MW)": diesel_with,
+            "Solar Used (without V2G) (MW)": without_v2g["solar_used"],
+            "Diesel Used (without V2G) (MW)": diesel_without,
+            "Diesel Savings (MW)": diesel_without - diesel_with,
+            "Diesel Cost (with V2G) (MAD)": diesel_cost_with,
+            "Diesel Cost (without V2G) (MAD)": diesel_cost_without,
+            "V2G Cost (MAD)": v2g_cost,
+            "Cost Savings (MAD)": diesel_cost_without - (diesel_cost_with + v2g_cost)
+        }, copy=False)
+        
+        # Display the hourly data
+        st.dataframe(hourly_data, use_container_width=True)
 
-with tab2:
-    if 'results' not in st.session_state or st.session_state.results is None:
-        st.info("Analysis is running...")
-    else:
-        results = st.session_state.results
+@st.fragment
+def render_reports(results, diesel_price, v2g_price):
+    """Render the Reports tab; clicking the download reruns only this fragment."""
+    st.markdown("## Optimization Reports")
+    
+    # Create Excel report for download
+    if results["results_with_v2g"] and results["results_without_v2g"]:
+        # Cached on its inputs, so the workbook is only rebuilt when they change
+        excel_file = create_excel_report(
+            results["results_with_v2g"], 
+            results["results_without_v2g"], 
+            results["date_range"], 
+            results["load_pred"],
+            results["forecast_days"],
+            diesel_price,
+            v2g_price
+        )
+        
+        st.download_button(
+            label="📊 Download Complete Report (Excel)",
+            data=excel_file,
+            file_name=f"v2g_optimization_report_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        
+        st.markdown("### Report Contents")
+        st.markdown("""
+        The downloaded report includes:
+        - Complete hourly optimization data
+        - Energy source distribution analysis
+        - Cost comparison between V2G and non-V2G scenarios
+        - Summary statistics and key performance indicators
+        - V2G usage patterns and peak hour analysis
+        """)
+        
+        st.markdown("### Recommendations")
+        
+        # Generate some simple recommendations based on the results
+        cost_savings = results["results_without_v2g"]['total_cost'] - results["results_with_v2g"]['total_cost']
+        percent_savings = (cost_savings / results["results_without_v2g"]['total_cost']) * 100
         
-        st.markdown("## V2G Usage Analysis")
+        if percent_savings > 15:
+            recommendation = "V2G integration shows substantial cost benefits. Consider increasing V2G capacity for greater savings."
+        elif percent_savings > 5:
+            recommendation = "V2G integration provides moderate cost benefits. Current implementation is effective."
+        else:
+            recommendation = "V2G benefits are minimal with current parameters. Consider adjusting V2G pricing or increasing maximum V2G hours."
         
-        results["date_range"] = np.array(results["date_range"])
+        st.info(recommendation)
 
-        # V2G usage analysis
-        if results["results_with_v2g"]:
-            v2g_usage = results["results_with_v2g"]['v2g_used']
-            significant_v2g = (v2g_usage > 0.1)  # Using 0.1 MW as threshold
-            
-            if sum(significant_v2g) > 0:
-                # V2G usage chart
-                v2g_fig = plot_v2g_usage(
-                    results["date_range"][significant_v2g], 
-                    v2g_usage[significant_v2g],
-                    results["load_pred"].flatten()[significant_v2g]
-                )
-                st.plotly_chart(v2g_fig, use_container_width=True)
-                
-                # V2G usage table
-                st.markdown("### Peak Hours When V2G is Used")
-                peak_v2g_df = pd.DataFrame({
-                    "Date": results["date_range"][significant_v2g],
-                    "Hour": [d.hour for d in results["date_range"][significant_v2g]],
-                    "Load (MW)": results["load_pred"].flatten()[significant_v2g],
-                    "V2G Used (MW)": v2g_usage[significant_v2g]
-                })
-                st.dataframe(peak_v2g_df, use_container_width=True)
-            else:
-                st.info("No significant V2G usage detected in this forecast period.")
+# Main content
+tab1, tab2, tab3 = st.tabs(["Dashboard", "Detailed Analysis", "Reports"])
+
+with tab1:
+    # Load data and models
+    with st.spinner("Loading data and models..."):
+        data = load_data()
+        grid_load_model, solar_energy_model, ev_model = load_prediction_models()
         
-        st.markdown("## Hourly Energy Analysis")
+        if data is not None:
+            # Prepare data for models
+            time_steps = 15
+            X_test_load, X_test_solar, X_test_ev, scaler_y, historical_data, last_date = prepare_data_for_models(
+                data, time_steps, forecast_days
+            )
+
+    # Setup app state for storing results
+    if 'results' not in st.session_state:
+        st.session_state.results = None
+    
+    # Auto-run analysis
+    with st.spinner("Running analysis..."):
+        # Make predictions
+        load_pred, solar_energy_pred, ev_pred_inv, date_range = make_predictions(
+            forecast_days, X_test_load, X_test_solar, X_test_ev, scaler_y,
+            grid_load_model, solar_energy_model, ev_model, last_date
+        )
         
-        if results["results_with_v2g"] and results["results_without_v2g"]:
-            # Create detailed hourly comparison dataframe
-            hourly_data = pd.DataFrame({
-                "Date": results["date_range"],
-                "Hour": [d.hour for d in results["date_range"]],
-                "Load (MW)": results["load_pred"].flatten(),
-                "Solar Generation (MW)": results["solar_energy_pred"].flatten(),
-                "EV Available (MW)": results["ev_pred_inv"].flatten(),
-                "Solar Used (with V2G) (MW)": results["results_with_v2g"]["solar_used"],
-                "V2G Used (MW)": results["results_with_v2g"]["v2g_used"],
-                "Diesel Used (with V2G) (MW)": results["results_with_v2g"]["diesel_used"],
-                "Solar Used (without V2G) (MW)": results["results_without_v2g"]["solar_used"],
-                "Diesel Used (without V2G) (MW)": results["results_without_v2g"]["diesel_used"]
-            })
-            
-            # Add calculated columns
-            hourly_data["Diesel Savings (MW)"] = hourly_data["Diesel Used (without V2G) (MW)"] - hourly_data["Diesel Used (with V2G) (MW)"]
-            hourly_data["Diesel Cost (with V2G) (MAD)"] = hourly_data["Diesel Used (with V2G) (MW)"] * diesel_price
-            hourly_data["Diesel Cost (without V2G) (MAD)"] = hourly_data["Diesel Used (without V2G) (MW)"] * diesel_price
-            hourly_data["V2G Cost (MAD)"] = hourly_data["V2G Used (MW)"] * v2g_price
-            hourly_data["Cost Savings (MAD)"] = hourly_data["Diesel Cost (without V2G) (MAD)"] - (hourly_data["Diesel Cost (with V2G) (MAD)"] + hourly_data["V2G Cost (MAD)"])
-            
-            # Display the hourly data
-            st.dataframe(hourly_data, use_container_width=True)
+        # Flat views of the (hours, 1) forecasts, shared by both optimizations
+        load_flat = load_pred.ravel()
+        solar_flat = solar_energy_pred.ravel()
+        ev_flat = ev_pred_inv.ravel()
+        
+        # Run optimization
+        hours = len(load_flat)
+        render_optimization_details(max_v2g_hours)
+        
+        # Run optimization with V2G
+        results_with_v2g = optimize_with_v2g(
+            load_flat, 
+            solar_flat, 
+            ev_flat, 
+            hours, 
+            v2g_price, 
+            diesel_price,
+            max_v2g_hours
+        )
+        
+        # Run optimization without V2G
+        results_without_v2g = optimize_without_v2g(
+            load_flat, 
+            solar_flat, 
+            hours, 
+            diesel_price
+        )
+        
+        # Store results in session state
+        st.session_state.results = {
+            "load_pred": load_pred,
+            "solar_energy_pred": solar_energy_pred,
+            "ev_pred_inv": ev_pred_inv,
+            "date_range": date_range,
+            "results_with_v2g": results_with_v2g,
+            "results_without_v2g": results_without_v2g,
+            "forecast_days": forecast_days,
+            "historical_data": historical_data
+        }
+    
+    render_dashboard(st.session_state.results)
 
-with tab3:
+
+with tab2:
     if 'results' not in st.session_state or st.session_state.results is None:
         st.info("Analysis is running...")
     else:
-        st.markdown("## Optimization Reports")
-        
-        results = st.session_state.results
-        
-        # Create Excel report for download
-        if results["results_with_v2g"] and results["results_without_v2g"]:
-            excel_file = create_excel_report(
-                results["results_with_v2g"], 
-                results["results_without_v2g"], 
-                results["date_range"], 
-                results["load_pred"],
-                results["forecast_days"],
-                diesel_price,
-                v2g_price
-            )
-            
-            st.download_button(
-                label="📊 Download Complete Report (Excel)",
-                data=excel_file,
-                file_name=f"v2g_optimization_report_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            
-            st.markdown("### Report Contents")
-            st.markdown("""
-            The downloaded report includes:
-            - Complete hourly optimization data
-            - Energy source distribution analysis
-            - Cost comparison between V2G and non-V2G scenarios
-            - Summary statistics and key performance indicators
-            - V2G usage patterns and peak hour analysis
-            """)
-            
-            st.markdown("### Recommendations")
-            
-            # Generate some simple recommendations based on the results
-            cost_savings = results["results_without_v2g"]['total_cost'] - results["results_with_v2g"]['total_cost']
-            percent_savings = (cost_savings / results["results_without_v2g"]['total_cost']) * 100
-            
-            if percent_savings > 15:
-                recommendation = "V2G integration shows substantial cost benefits. Consider increasing V2G capacity for greater savings."
-            elif percent_savings > 5:
-                recommendation = "V2G integration provides moderate cost benefits. Current implementation is effective."
-            else:
-                recommendation = "V2G benefits are minimal with current parameters. Consider adjusting V2G pricing or increasing maximum V2G hours."
-            
-            st.info(recommendation)
-
+        render_detailed_analysis(st.session_state.results, diesel_price, v2g_price)
 
+with tab3:
+    if 'results' not in st.session_state or st.session_state.results is None:
+        st.info("Analysis is running...")
+    else:
+        render_reports(st.session_state.results, diesel_price, v2g_price)
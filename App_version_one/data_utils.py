@@ -1,20 +1,53 @@
 import os
+from collections import namedtuple
 import streamlit as st
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 
+# Struct-of-arrays view of the three datasets, aligned by row
+DataBundle = namedtuple('DataBundle', 'time load solar ev')
+
 def create_dataset(serie, time_steps=1):
     """Create input/output pairs for time series prediction."""
-    Xs, ys = [], []
-    for i in range(len(serie) - time_steps):
-        Xs.append(serie.iloc[i:(i + time_steps)].values)
-        ys.append(serie.iloc[i + time_steps])
-    return np.array(Xs), np.array(ys)
+    arr = serie.to_numpy(dtype=np.float32)
+    # Strided view over the series: no per-window copies
+    Xs = np.lib.stride_tricks.sliding_window_view(arr, time_steps, axis=0)[:-1]
+    if arr.ndim > 1:
+        Xs = np.moveaxis(Xs, -1, 1)
+    ys = arr[time_steps:]
+    return Xs, ys
+
+def _read_excel_snapshot(xlsx_path):
+    """Read an Excel dataset, going through a Parquet snapshot kept next to it."""
+    parquet_path = os.path.splitext(xlsx_path)[0] + ".parquet"
+    
+    # Reuse the snapshot unless the Excel file has been updated since
+    if os.path.exists(parquet_path) and (
+        not os.path.exists(xlsx_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(xlsx_path)
+    ):
+        return pd.read_parquet(parquet_path)
+    
+    df = pd.read_excel(xlsx_path)
+    try:
+        df.to_parquet(parquet_path, index=False)
+    except (ImportError, OSError):
+        # The snapshot is only a speed-up; keep serving from Excel without it
+        pass
+    return df
+
+def _to_bundle(load_df, solar_energy_df, ev_dispo_df):
+    """Pack the dataset frames into contiguous numpy arrays."""
+    return DataBundle(
+        time=load_df['Time'].to_numpy(dtype='datetime64[ns]'),
+        load=load_df['Load'].to_numpy(dtype=np.float32),
+        solar=solar_energy_df['SolarEnergy'].to_numpy(dtype=np.float32),
+        ev=ev_dispo_df['total_usable_power_all_profiles_MW'].to_numpy(dtype=np.float32)
+    )
 
-@st.cache_data
+@st.cache_resource
 def load_data():
-    """Load and preprocess the datasets."""
+    """Load and preprocess the datasets into a shared DataBundle."""
     data_path = "data/"
     
     try:
@@ -25,23 +58,24 @@ def load_data():
             # Create sample data for demo purposes
             create_sample_data(data_path)
             
-        # Load data from files
-        if not os.path.exists(os.path.join(data_path, "Total_Load.xlsx")):
+        # Load data from files; sample data only exists as Parquet
+        if not os.path.exists(os.path.join(data_path, "Total_Load.xlsx")) and \
+           not os.path.exists(os.path.join(data_path, "Total_Load.parquet")):
             create_sample_data(data_path)
             
-        load_df = pd.read_excel(os.path.join(data_path, "Total_Load.xlsx"))
-        solar_energy_df = pd.read_excel(os.path.join(data_path, "Solar_Energy.xlsx"))
-        ev_dispo_df = pd.read_excel(os.path.join(data_path, "total_power_EV_disponible.xlsx"))
+        load_df = _read_excel_snapshot(os.path.join(data_path, "Total_Load.xlsx"))
+        solar_energy_df = _read_excel_snapshot(os.path.join(data_path, "Solar_Energy.xlsx"))
+        ev_dispo_df = _read_excel_snapshot(os.path.join(data_path, "total_power_EV_disponible.xlsx"))
         
         # Set up time index
         start_date = pd.to_datetime('2022-06-07 00:00')
         load_df['Time'] = start_date + pd.to_timedelta(load_df['Time'], unit='s')
         solar_energy_df['Time'] = start_date + pd.to_timedelta(solar_energy_df['Time'], unit='s')
         
-        return load_df, solar_energy_df, ev_dispo_df
+        return _to_bundle(load_df, solar_energy_df, ev_dispo_df)
     except Exception as e:
         st.warning(f"Using synthetic data because: {e}")
-        return create_synthetic_data()
+        return _to_bundle(*create_synthetic_data())
 
 def create_sample_data(data_path):
     """Create sample data for demonstration purposes."""
@@ -50,36 +84,36 @@ def create_sample_data(data_path):
     time_seconds = np.arange(0, hours * 3600, 3600)
     
     # Total Load data - follows a daily pattern with some noise
-    load_pattern = 10 + 5 * np.sin(np.linspace(0, 2*np.pi*3, hours)) + 2 * np.sin(np.linspace(0, 2*np.pi*hours, hours))
-    load_with_noise = load_pattern + np.random.normal(0, 0.5, hours)
+    load_pattern = 10 + 5 * np.sin(np.linspace(0, 2*np.pi*3, hours, dtype=np.float32)) + 2 * np.sin(np.linspace(0, 2*np.pi*hours, hours, dtype=np.float32))
+    load_with_noise = load_pattern + np.random.normal(0, 0.5, hours).astype(np.float32)
     load_df = pd.DataFrame({
         'Time': time_seconds,
         'Load': load_with_noise
     })
     
     # Solar Energy data - peaks during day hours
-    day_pattern = np.sin(np.linspace(0, 2*np.pi, 24)) * 0.5 + 0.5  # Daily solar pattern
+    day_pattern = np.sin(np.linspace(0, 2*np.pi, 24, dtype=np.float32)) * 0.5 + 0.5  # Daily solar pattern
     solar_pattern = np.tile(day_pattern, 3)  # Repeat for 3 days
-    solar_with_noise = solar_pattern * 7 + np.random.normal(0, 0.3, hours)
-    solar_with_noise = np.maximum(0, solar_with_noise)  # No negative solar generation
+    solar_with_noise = solar_pattern * 7 + np.random.normal(0, 0.3, hours).astype(np.float32)
+    np.maximum(solar_with_noise, 0, out=solar_with_noise)  # No negative solar generation
     solar_energy_df = pd.DataFrame({
         'Time': time_seconds,
         'SolarEnergy': solar_with_noise
     })
     
     # EV availability data - higher during night hours
-    night_pattern = 1 - 0.7 * np.sin(np.linspace(0, 2*np.pi, 24)) * 0.5 - 0.5  # Inverse of day pattern
-    ev_pattern = np.tile(night_pattern, 3) * 8 + np.random.normal(0, 0.2, hours)
-    ev_pattern = np.maximum(0, ev_pattern)  # No negative EV availability
+    night_pattern = 1 - 0.7 * np.sin(np.linspace(0, 2*np.pi, 24, dtype=np.float32)) * 0.5 - 0.5  # Inverse of day pattern
+    ev_pattern = np.tile(night_pattern, 3) * 8 + np.random.normal(0, 0.2, hours).astype(np.float32)
+    np.maximum(ev_pattern, 0, out=ev_pattern)  # No negative EV availability
     ev_dispo_df = pd.DataFrame({
         'Hour': np.arange(hours),
         'total_usable_power_all_profiles_MW': ev_pattern
     })
     
-    # Save to Excel files
-    load_df.to_excel(os.path.join(data_path, "Total_Load.xlsx"), index=False)
-    solar_energy_df.to_excel(os.path.join(data_path, "Solar_Energy.xlsx"), index=False)
-    ev_dispo_df.to_excel(os.path.join(data_path, "total_power_EV_disponible.xlsx"), index=False)
+    # Save as Parquet; load_data picks these up in place of the Excel files
+    load_df.to_parquet(os.path.join(data_path, "Total_Load.parquet"), index=False)
+    solar_energy_df.to_parquet(os.path.join(data_path, "Solar_Energy.parquet"), index=False)
+    ev_dispo_df.to_parquet(os.path.join(data_path, "total_power_EV_disponible.parquet"), index=False)
 
 def create_synthetic_data():
     """Create synthetic data for demonstration when real data is unavailable."""
@@ -87,29 +121,30 @@ def create_synthetic_data():
     hours = 3 * 24  # 3 days of hourly data
     time_seconds = np.arange(0, hours * 3600, 3600)
     start_date = pd.to_datetime('2022-06-07 00:00')
+    times = start_date + pd.to_timedelta(time_seconds, unit='s')
     
     # Total Load data
-    load_pattern = 10 + 5 * np.sin(np.linspace(0, 2*np.pi*3, hours)) + 2 * np.sin(np.linspace(0, 2*np.pi*hours, hours))
-    load_with_noise = load_pattern + np.random.normal(0, 0.5, hours)
+    load_pattern = 10 + 5 * np.sin(np.linspace(0, 2*np.pi*3, hours, dtype=np.float32)) + 2 * np.sin(np.linspace(0, 2*np.pi*hours, hours, dtype=np.float32))
+    load_with_noise = load_pattern + np.random.normal(0, 0.5, hours).astype(np.float32)
     load_df = pd.DataFrame({
-        'Time': [start_date + pd.Timedelta(seconds=s) for s in time_seconds],
+        'Time': times,
         'Load': load_with_noise
     })
     
     # Solar Energy data
-    day_pattern = np.sin(np.linspace(0, 2*np.pi, 24)) * 0.5 + 0.5
+    day_pattern = np.sin(np.linspace(0, 2*np.pi, 24, dtype=np.float32)) * 0.5 + 0.5
     solar_pattern = np.tile(day_pattern, 3)
-    solar_with_noise = solar_pattern * 7 + np.random.normal(0, 0.3, hours)
-    solar_with_noise = np.maximum(0, solar_with_noise)
+    solar_with_noise = solar_pattern * 7 + np.random.normal(0, 0.3, hours).astype(np.float32)
+    np.maximum(solar_with_noise, 0, out=solar_with_noise)
     solar_energy_df = pd.DataFrame({
-        'Time': [start_date + pd.Timedelta(seconds=s) for s in time_seconds],
+        'Time': times,
         'SolarEnergy': solar_with_noise
     })
     
     # EV availability data
-    night_pattern = 1 - 0.7 * np.sin(np.linspace(0, 2*np.pi, 24)) * 0.5 - 0.5
-    ev_pattern = np.tile(night_pattern, 3) * 8 + np.random.normal(0, 0.2, hours)
-    ev_pattern = np.maximum(0, ev_pattern)
+    night_pattern = 1 - 0.7 * np.sin(np.linspace(0, 2*np.pi, 24, dtype=np.float32)) * 0.5 - 0.5
+    ev_pattern = np.tile(night_pattern, 3) * 8 + np.random.normal(0, 0.2, hours).astype(np.float32)
+    np.maximum(ev_pattern, 0, out=ev_pattern)
     ev_dispo_df = pd.DataFrame({
         'Hour': np.arange(hours),
         'total_usable_power_all_profiles_MW': ev_pattern
@@ -117,42 +152,52 @@ def create_synthetic_data():
     
     return load_df, solar_energy_df, ev_dispo_df
 
-def get_historical_data(load_df, solar_energy_df, ev_dispo_df, end_date, days):
+def get_historical_data(data, end_date, days):
     """Get historical data for comparison."""
-    end_idx = load_df[load_df['Time'] <= end_date].index[-1]
+    # Time is sorted, so a binary search finds the last row at or before end_date
+    end_idx = np.searchsorted(data.time, np.datetime64(end_date), side='right') - 1
     start_idx = max(0, end_idx - (days * 24) + 1)
+    window = slice(start_idx, end_idx + 1)
     
     historical_data = {
-        'date_range': load_df['Time'][start_idx:end_idx + 1],
-        'load': load_df['Load'][start_idx:end_idx + 1].values,
-        'solar': solar_energy_df['SolarEnergy'][start_idx:end_idx + 1].values,
-        'ev': ev_dispo_df['total_usable_power_all_profiles_MW'][start_idx:end_idx + 1].values
+        'date_range': pd.DatetimeIndex(data.time[window]),
+        'load': data.load[window],
+        'solar': data.solar[window],
+        'ev': data.ev[window]
     }
     
     return historical_data
 
-def prepare_data_for_models(load_df, solar_energy_df, ev_dispo_df, time_steps, forecast_days):
+def _bundle_key(data):
+    """Cheap cache key for the static dataset: length and last value of each array."""
+    return tuple((len(a), a[-1:].tobytes()) for a in data)
+
+@st.cache_resource(hash_funcs={DataBundle: _bundle_key})
+def fit_scalers(data):
+    """Fit the solar and EV scalers once per dataset."""
+    scaler_solar = MinMaxScaler().fit(data.solar.reshape(-1, 1))
+    scaler_X = MinMaxScaler().fit(data.ev.reshape(-1, 1))
+    scaler_y = MinMaxScaler().fit(data.ev.reshape(-1, 1))
+    return scaler_solar, scaler_X, scaler_y
+
+@st.cache_data(hash_funcs={DataBundle: _bundle_key})
+def prepare_data_for_models(data, time_steps, forecast_days):
     """Prepare data for model predictions."""
     # Get the last available date
-    last_date = load_df['Time'].max()
+    last_date = pd.Timestamp(data.time.max())
     
     # Get historical data for comparison
-    historical_data = get_historical_data(load_df, solar_energy_df, ev_dispo_df, last_date, forecast_days)
+    historical_data = get_historical_data(data, last_date, forecast_days)
     
     # Prepare prediction data using the last time_steps points
-    X_load = load_df['Load'].values[-time_steps:].reshape(1, time_steps, 1)
-    
-    # Scale solar data
-    scaler_solar = MinMaxScaler()
-    solar_scaled = scaler_solar.fit_transform(solar_energy_df['SolarEnergy'].values.reshape(-1, 1))
-    X_solar = solar_scaled[-time_steps:].reshape(1, time_steps, 1)
-    
-    # Scale EV data
-    scaler_X = MinMaxScaler()
-    scaler_y = MinMaxScaler()
-    ev_data = ev_dispo_df['total_usable_power_all_profiles_MW'].values
-    scaler_y.fit(ev_data.reshape(-1, 1))
-    ev_scaled = scaler_X.fit_transform(ev_data.reshape(-1, 1))
-    X_ev = ev_scaled[-time_steps:].reshape(1, time_steps, 1)
-    
-    return X_load, X_solar, X_ev, scaler_y, historical_data, last_date
\ No newline at end of file
+    X_load = np.ascontiguousarray(data.load[-time_steps:]).reshape(1, time_steps, 1)
+    
+    # Only the input windows need scaling; the fitted scalers are shared across reruns
+    scaler_solar, scaler_X, scaler_y = fit_scalers(data)
+    solar_scaled = scaler_solar.transform(data.solar[-time_steps:].reshape(-1, 1))
+    X_solar = np.ascontiguousarray(solar_scaled, dtype=np.float32).reshape(1, time_steps, 1)
+    
+    ev_scaled = scaler_X.transform(data.ev[-time_steps:].reshape(-1, 1))
+    X_ev = np.ascontiguousarray(ev_scaled, dtype=np.float32).reshape(1, time_steps, 1)
+    
+    return X_load, X_solar, X_ev, scaler_y, historical_data, last_date
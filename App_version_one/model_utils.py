@@ -1,20 +1,46 @@
 import os
 import streamlit as st
 import numpy as np
-import tensorflow as tf
-from datetime import datetime, timedelta
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, LSTM, GRU, Dropout
-from tensorflow.keras.metrics import MeanSquaredError, MeanAbsoluteError
+import pandas as pd
+from numba import njit
+from sklearn.preprocessing import MinMaxScaler
 
+# TensorFlow is imported inside the functions that need it, so loading this
+# module (and the first render of the page) does not wait on the TF import
 
 
+def _to_mixed_precision(model):
+    """Rebuild a loaded model with mixed_float16 layers and the same weights.
+
+    The output layer stays float32 so each prediction fed back into the
+    recursive window is not rounded to half precision.
+    """
+    import tensorflow as tf
+
+    output_layer = model.layers[-1]
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        if layer is output_layer:
+            config['dtype'] = 'float32'
+        elif not isinstance(layer, tf.keras.layers.InputLayer):
+            config['dtype'] = 'mixed_float16'
+        return layer.__class__.from_config(config)
+    
+    clone = tf.keras.models.clone_model(model, clone_function=clone_layer)
+    clone.set_weights(model.get_weights())
+    return clone
+
 @st.cache_resource
 def load_prediction_models():
     """Load pre-trained models or create simple models if not available."""
     model_path = "models/"
+    grid_load_model = solar_energy_model = ev_model = None
     
     try:
+        import tensorflow as tf
+        from tensorflow.keras.metrics import MeanSquaredError, MeanAbsoluteError
+        
         # Create models directory if it doesn't exist
         if not os.path.exists(model_path):
             os.makedirs(model_path)
@@ -42,51 +68,123 @@ def load_prediction_models():
         else:
             # Create simple models
             raise Exception("Pre-trained models not found, creating simple models")
+        
+        # Half-precision gate matmuls only pay off on GPU tensor cores;
+        # on CPU the float32 models are kept as loaded
+        if tf.config.list_physical_devices('GPU'):
+            grid_load_model = _to_mixed_precision(grid_load_model)
+            solar_energy_model = _to_mixed_precision(solar_energy_model)
+            ev_model = _to_mixed_precision(ev_model)
     
     except Exception as e:
-        st.warning(f"Error: {e}")
+        st.warning(f"Error: {e}. Falling back to a moving-average forecast.")
+        grid_load_model = solar_energy_model = ev_model = None
     
     return grid_load_model, solar_energy_model, ev_model
 
+def _build_rollout(grid_load_model, solar_energy_model, ev_model):
+    """Compile the autoregressive forecast loop of the three models into a single graph."""
+    import tensorflow as tf
+    
+    # XLA fuses each recurrent forward pass into one kernel; the input shape
+    # (1, time_steps, 1) is fixed, so each model is compiled only once.
+    # Outputs are cast back to float32 in case the models run in mixed precision
+    predict_load = tf.function(lambda x: tf.cast(grid_load_model(x, training=False), tf.float32), jit_compile=True)
+    predict_solar = tf.function(lambda x: tf.cast(solar_energy_model(x, training=False), tf.float32), jit_compile=True)
+    predict_ev = tf.function(lambda x: tf.cast(ev_model(x, training=False), tf.float32), jit_compile=True)
+    
+    @tf.function(reduce_retracing=True)
+    def rollout(load_win, solar_win, ev_win, hours):
+        load_out = tf.TensorArray(tf.float32, size=hours)
+        solar_out = tf.TensorArray(tf.float32, size=hours)
+        ev_out = tf.TensorArray(tf.float32, size=hours)
+        
+        for t in tf.range(hours):
+            # Direct calls skip the Keras predict() progbar/callback machinery
+            load_pred = predict_load(load_win)
+            solar_pred = predict_solar(solar_win)
+            ev_pred = predict_ev(ev_win)
+            
+            load_out = load_out.write(t, load_pred[0, 0])
+            solar_out = solar_out.write(t, solar_pred[0, 0])
+            ev_out = ev_out.write(t, ev_pred[0, 0])
+            
+            # Slide each window forward by one step
+            load_win = tf.concat([load_win[:, 1:, :], load_pred[:, None, :]], axis=1)
+            solar_win = tf.concat([solar_win[:, 1:, :], solar_pred[:, None, :]], axis=1)
+            ev_win = tf.concat([ev_win[:, 1:, :], ev_pred[:, None, :]], axis=1)
+        
+        return load_out.stack(), solar_out.stack(), ev_out.stack()
+    
+    return rollout
+
+_rollouts = {}
+
+@njit(cache=True, fastmath=True)
+def rollout_linear(w, b, hist, hours):
+    """Roll a linear autoregressive model forward; hist is shifted in place."""
+    n = hist.shape[0]
+    out = np.empty(hours, dtype=hist.dtype)
+    for t in range(hours):
+        y = b
+        for i in range(n):
+            y += w[i] * hist[i]
+        out[t] = y
+        for i in range(n - 1):
+            hist[i] = hist[i + 1]
+        hist[n - 1] = y
+    return out
+
+def _rollout_fallback(X_test_load, X_test_solar, X_test_ev, hours):
+    """Moving-average forecast used when the Keras models are unavailable."""
+    time_steps = X_test_load.shape[1]
+    w = np.full(time_steps, 1.0 / time_steps, dtype=np.float32)
+    b = np.float32(0.0)
+    # Copies, since the rollout shifts the history in place
+    return tuple(
+        rollout_linear(w, b, np.array(X, dtype=np.float32).ravel(), hours)
+        for X in (X_test_load, X_test_solar, X_test_ev)
+    )
+
+def _scaler_key(scaler):
+    """Cache key for a fitted MinMaxScaler: its fitted range."""
+    return scaler.data_min_.tobytes(), scaler.data_max_.tobytes()
+
+@st.cache_data(show_spinner=False, hash_funcs={MinMaxScaler: _scaler_key})
 def make_predictions(days, X_test_load, X_test_solar, X_test_ev, scaler_y, 
-                    grid_load_model, solar_energy_model, ev_model, last_date):
-    """Make predictions for the specified number of days."""
+                    _grid_load_model, _solar_energy_model, _ev_model, last_date):
+    """Make predictions for the specified number of days.
+    
+    Results are cached on the input windows, scaler and last date; the
+    underscore-prefixed models are excluded from the cache key.
+    """
     hours = days * 24
-    predictions = []
-    current_load_input = X_test_load
-    current_solar_input = X_test_solar
-    current_ev_input = X_test_ev
     
     # Start predictions from the last available date plus one hour
-    start_date = last_date + timedelta(hours=1)
-    date_range = [start_date + timedelta(hours=i) for i in range(hours)]
+    date_range = pd.date_range(last_date + pd.Timedelta(hours=1), periods=hours, freq='h')
     
-    for _ in range(hours):
-        # Make predictions
-        load_pred = grid_load_model.predict(current_load_input, verbose=0)
-        solar_pred = solar_energy_model.predict(current_solar_input, verbose=0)
-        ev_pred = ev_model.predict(current_ev_input, verbose=0)
-        
-        # Store predictions
-        predictions.append({
-            'load': load_pred[0, 0],
-            'solar': max(0, solar_pred[0, 0]),  # Ensure non-negative solar values
-            'ev': scaler_y.inverse_transform(ev_pred)[0, 0]
-        })
-        
-        # Update inputs for next prediction
-        current_load_input = np.roll(current_load_input, -1, axis=1)
-        current_load_input[0, -1, 0] = load_pred[0, 0]
+    if _grid_load_model is None or _solar_energy_model is None or _ev_model is None:
+        load_out, solar_out, ev_out = _rollout_fallback(X_test_load, X_test_solar, X_test_ev, hours)
+    else:
+        import tensorflow as tf
         
-        current_solar_input = np.roll(current_solar_input, -1, axis=1)
-        current_solar_input[0, -1, 0] = solar_pred[0, 0]
+        # Reuse the traced rollout across calls for the same set of models
+        key = (id(_grid_load_model), id(_solar_energy_model), id(_ev_model))
+        if key not in _rollouts:
+            _rollouts[key] = _build_rollout(_grid_load_model, _solar_energy_model, _ev_model)
         
-        current_ev_input = np.roll(current_ev_input, -1, axis=1)
-        current_ev_input[0, -1, 0] = ev_pred[0, 0]
+        # The windows are shifted inside the graph, so the caller's arrays are
+        # never written to; float32 inputs avoid a cast on every call
+        load_out, solar_out, ev_out = (out.numpy() for out in _rollouts[key](
+            np.ascontiguousarray(X_test_load, dtype=np.float32),
+            np.ascontiguousarray(X_test_solar, dtype=np.float32),
+            np.ascontiguousarray(X_test_ev, dtype=np.float32),
+            tf.constant(hours)
+        ))
     
     # Convert predictions to arrays
-    load_pred = np.array([p['load'] for p in predictions]).reshape(-1, 1)
-    solar_energy_pred = np.array([p['solar'] for p in predictions]).reshape(-1, 1)
-    ev_pred_inv = np.array([p['ev'] for p in predictions]).reshape(-1, 1)
+    load_pred = load_out.reshape(-1, 1)
+    solar_energy_pred = np.maximum(0, solar_out).reshape(-1, 1)  # Ensure non-negative solar values
+    ev_pred_inv = scaler_y.inverse_transform(ev_out.reshape(-1, 1))
     
-    return load_pred, solar_energy_pred, ev_pred_inv, date_range
\ No newline at end of file
+    return load_pred, solar_energy_pred, ev_pred_inv, date_range
@@ -3,6 +3,10 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 
+# Cache keys for DatetimeIndex arguments: their raw int64 values
+DATETIME_HASH_FUNCS = {pd.DatetimeIndex: lambda idx: idx.asi8.tobytes()}
+
+@st.cache_data(show_spinner=False, hash_funcs=DATETIME_HASH_FUNCS)
 def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_pred, 
                         forecast_days, diesel_price, v2g_price):
     """
@@ -30,8 +34,15 @@ def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_
     BytesIO
         Excel file as bytes for download
     """
+    # 1-D view of the load column (no copy for contiguous input)
+    load_flat = np.asarray(load_pred).reshape(-1)
+    total_load = float(load_flat.sum())
+    total_solar = float((results_with_v2g or results_without_v2g)['solar_used'].sum())
+    
     output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
+    # Stream rows to temporary files instead of holding every cell in memory
+    writer = pd.ExcelWriter(output, engine='xlsxwriter',
+                            engine_kwargs={'options': {'constant_memory': True, 'strings_to_numbers': False}})
     
     workbook = writer.book
     
@@ -79,6 +90,11 @@ def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_
         'num_format': '#,##0.00 "MAD"'
     })
     
+    good_cell_format = workbook.add_format({
+        'bg_color': '#C6EFCE',
+        'font_color': '#006100'
+    })
+    
     # Create summary sheet
     summary_data = {
         "Metric": [
@@ -90,8 +106,8 @@ def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_
         ],
         "Value": [
             forecast_days,
-            float(np.sum(load_pred)),
-            float(np.sum(results_with_v2g['solar_used'])) if results_with_v2g else float(np.sum(results_without_v2g['solar_used'])),
+            total_load,
+            total_solar,
             diesel_price,
             v2g_price
         ]
@@ -125,9 +141,9 @@ def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_
     
     if results_with_v2g and results_without_v2g:
         cost_savings = results_without_v2g['total_diesel_cost'] - results_with_v2g['total_cost']
-        percent_savings = (cost_savings / results_without_v2g['total_diesel_cost']) * 100 / 100  # Convert to decimal for Excel
+        percent_savings = cost_savings / results_without_v2g['total_diesel_cost']  # Decimal for Excel's percent format
         diesel_savings = results_without_v2g['total_diesel_energy'] - results_with_v2g['total_diesel_energy']
-        percent_diesel_savings = (diesel_savings / results_without_v2g['total_diesel_energy']) * 100 / 100  # Convert to decimal for Excel
+        percent_diesel_savings = diesel_savings / results_without_v2g['total_diesel_energy']
         
         summary_data["Metric"].extend([
             "Diesel Energy Savings (MWh)",
@@ -142,247 +158,173 @@ def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_
             percent_savings
         ])
     
-    summary_df = pd.DataFrame(summary_data)
-    summary_df.to_excel(writer, sheet_name='Summary', index=False)
-    
-    # Format summary sheet
-    summary_sheet = writer.sheets['Summary']
+    # Constant-memory mode flushes a row to disk as soon as the next one starts,
+    # so every sheet below is written strictly top to bottom, header first
+    summary_sheet = workbook.add_worksheet('Summary')
     summary_sheet.set_column('A:A', 40)
     summary_sheet.set_column('B:B', 20)
     
-    # Write headers with format
-    for col_num, value in enumerate(summary_df.columns.values):
-        summary_sheet.write(0, col_num, value, header_format)
+    summary_sheet.write_row(0, 0, ["Metric", "Value"], header_format)
+    for row, (metric, value) in enumerate(zip(summary_data["Metric"], summary_data["Value"]), start=1):
+        summary_sheet.write_string(row, 0, metric)
+        summary_sheet.write_number(row, 1, float(value))
     
     # Apply conditional formatting to key metrics
     summary_sheet.conditional_format('B12:B12', {'type': 'cell',
                                               'criteria': '>',
                                               'value': 0,
-                                              'format': workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})})
+                                              'format': good_cell_format})
     
     summary_sheet.conditional_format('B14:B14', {'type': 'cell',
                                               'criteria': '>',
                                               'value': 0,
-                                              'format': workbook.add_format({'bg_color': '#C6EFCE', 'font_color': '#006100'})})
+                                              'format': good_cell_format})
     
     hours = len(date_range)
     
-    # Create hourly data sheet with V2G
+    # Calendar fields extracted once, vectorized, and shared by every sheet
+    dti = pd.DatetimeIndex(date_range)
+    hours_arr = dti.hour.to_numpy()
+    days_arr = dti.day.to_numpy()
+    date_only_arr = dti.normalize().to_numpy()
+    
+    # Native datetimes for the row writer
+    dates_list = dti.to_pydatetime().tolist()
+    
+    # One long-form hourly sheet with a Scenario column instead of one sheet per
+    # scenario plus a comparison sheet; the autofilter slices it by scenario
+    scenarios = []
     if results_with_v2g:
-        df_with_v2g = pd.DataFrame({
-            "Date": date_range,
-            "Hour": [d.hour for d in date_range],
-            "Day": [d.day for d in date_range],
-            "Load (MW)": load_pred.flatten(),
-            "Solar Used (MW)": results_with_v2g['solar_used'],
-            "V2G Used (MW)": results_with_v2g['v2g_used'],
-            "Diesel Used (MW)": results_with_v2g['diesel_used'],
-            "Diesel Cost (MAD)": results_with_v2g['diesel_used'] * diesel_price,
-            "V2G Cost (MAD)": results_with_v2g['v2g_used'] * v2g_price,
-            "Total Cost (MAD)": (results_with_v2g['diesel_used'] * diesel_price) + 
-                               (results_with_v2g['v2g_used'] * v2g_price)
-        })
-        
-        df_with_v2g.to_excel(writer, sheet_name='With V2G', index=False)
-        
-        # Format With V2G sheet
-        with_v2g_sheet = writer.sheets['With V2G']
-        with_v2g_sheet.set_column('A:A', 20, date_format)
-        with_v2g_sheet.set_column('B:D', 8)
-        with_v2g_sheet.set_column('E:G', 15, number_format)
-        with_v2g_sheet.set_column('H:J', 18, currency_format)
-        
-        # Write headers with format
-        for col_num, value in enumerate(df_with_v2g.columns.values):
-            with_v2g_sheet.write(0, col_num, value, header_format)
-        
-        # Add totals row
-        total_row = len(df_with_v2g) + 1
-        with_v2g_sheet.write(total_row, 0, "TOTAL", total_format)
-        with_v2g_sheet.write_formula(total_row, 4, f'=SUM(E2:E{total_row})', total_format)
-        with_v2g_sheet.write_formula(total_row, 5, f'=SUM(F2:F{total_row})', total_format)
-        with_v2g_sheet.write_formula(total_row, 6, f'=SUM(G2:G{total_row})', total_format)
-        with_v2g_sheet.write_formula(total_row, 7, f'=SUM(H2:H{total_row})', total_currency_format)
-        with_v2g_sheet.write_formula(total_row, 8, f'=SUM(I2:I{total_row})', total_currency_format)
-        with_v2g_sheet.write_formula(total_row, 9, f'=SUM(J2:J{total_row})', total_currency_format)
-    
-    # Create hourly data sheet without V2G
+        scenarios.append(("With V2G", results_with_v2g['v2g_used'], results_with_v2g))
     if results_without_v2g:
-        df_without_v2g = pd.DataFrame({
-            "Date": date_range,
-            "Hour": [d.hour for d in date_range],
-            "Day": [d.day for d in date_range],
-            "Load (MW)": load_pred.flatten(),
-            "Solar Used (MW)": results_without_v2g['solar_used'],
-            "Diesel Used (MW)": results_without_v2g['diesel_used'],
-            "Diesel Cost (MAD)": results_without_v2g['diesel_used'] * diesel_price,
-            "Total Cost (MAD)": results_without_v2g['diesel_used'] * diesel_price
-        })
+        scenarios.append(("Without V2G", np.zeros(hours), results_without_v2g))
+    
+    if scenarios:
+        n_scenarios = len(scenarios)
+        last_row = hours * n_scenarios + 1
+        # Per-hour savings sit on each "With V2G" row, against the "Without V2G" row below it
+        has_savings = n_scenarios == 2
+        last_col = 11 if has_savings else 10
         
-        df_without_v2g.to_excel(writer, sheet_name='Without V2G', index=False)
+        detail_sheet = workbook.add_worksheet('Hourly Detail')
+        detail_sheet.set_column('A:A', 20, date_format)
+        detail_sheet.set_column('B:B', 14)
+        detail_sheet.set_column('C:D', 8)
+        detail_sheet.set_column('E:H', 15, number_format)
+        detail_sheet.set_column('I:L', 18, currency_format)
         
-        # Format Without V2G sheet
-        without_v2g_sheet = writer.sheets['Without V2G']
-        without_v2g_sheet.set_column('A:A', 20, date_format)
-        without_v2g_sheet.set_column('B:D', 8)
-        without_v2g_sheet.set_column('E:F', 15, number_format)
-        without_v2g_sheet.set_column('G:H', 18, currency_format)
+        headers = ["Date", "Scenario", "Hour", "Day", "Load (MW)", "Solar Used (MW)", "V2G Used (MW)",
+                   "Diesel Used (MW)", "Diesel Cost (MAD)", "V2G Cost (MAD)", "Total Cost (MAD)"]
+        if has_savings:
+            headers.append("Savings (MAD)")
+        detail_sheet.write_row(0, 0, headers, header_format)
         
-        # Write headers with format
-        for col_num, value in enumerate(df_without_v2g.columns.values):
-            without_v2g_sheet.write(0, col_num, value, header_format)
+        # Scenarios interleaved hour by hour so the rows stay in date order
+        block = np.empty((hours, n_scenarios, 6))
+        for i, (_, v2g_used, results) in enumerate(scenarios):
+            block[:, i] = np.column_stack([hours_arr, days_arr, load_flat, results['solar_used'],
+                                           v2g_used, results['diesel_used']])
+        block = block.reshape(-1, 6).tolist()
+        savings_total = 0.0
         
-        # Add totals row
-        total_row = len(df_without_v2g) + 1
-        without_v2g_sheet.write(total_row, 0, "TOTAL", total_format)
-        without_v2g_sheet.write_formula(total_row, 4, f'=SUM(E2:E{total_row})', total_format)
-        without_v2g_sheet.write_formula(total_row, 5, f'=SUM(F2:F{total_row})', total_format)
-        without_v2g_sheet.write_formula(total_row, 6, f'=SUM(G2:G{total_row})', total_currency_format)
-        without_v2g_sheet.write_formula(total_row, 7, f'=SUM(H2:H{total_row})', total_currency_format)
-    
-    # Create comparison sheet
-    if results_with_v2g and results_without_v2g:
-        df_comparison = pd.DataFrame({
-            "Date": date_range,
-            "Hour": [d.hour for d in date_range],
-            "Day": [d.day for d in date_range],
-            "Load (MW)": load_pred.flatten(),
-            "Diesel Used (with V2G) (MW)": results_with_v2g['diesel_used'],
-            "Diesel Used (without V2G) (MW)": results_without_v2g['diesel_used'],
-            "Diesel Savings (MW)": results_without_v2g['diesel_used'] - results_with_v2g['diesel_used'],
-            "Cost (with V2G) (MAD)": (results_with_v2g['diesel_used'] * diesel_price) + 
-                                    (results_with_v2g['v2g_used'] * v2g_price),
-            "Cost (without V2G) (MAD)": results_without_v2g['diesel_used'] * diesel_price,
-            "Cost Savings (MAD)": (results_without_v2g['diesel_used'] * diesel_price) - 
-                                 ((results_with_v2g['diesel_used'] * diesel_price) + 
-                                  (results_with_v2g['v2g_used'] * v2g_price)),
-            "Savings (%)": (((results_without_v2g['diesel_used'] * diesel_price) - 
-                           ((results_with_v2g['diesel_used'] * diesel_price) + 
-                            (results_with_v2g['v2g_used'] * v2g_price))) / 
-                          (results_without_v2g['diesel_used'] * diesel_price) * 100) / 100  # Convert to decimal for Excel
-        })
-        
-        df_comparison.to_excel(writer, sheet_name='Comparison', index=False)
-        
-        # Format Comparison sheet
-        comparison_sheet = writer.sheets['Comparison']
-        comparison_sheet.set_column('A:A', 20, date_format)
-        comparison_sheet.set_column('B:D', 8)
-        comparison_sheet.set_column('E:G', 15, number_format)
-        comparison_sheet.set_column('H:J', 18, currency_format)
-        comparison_sheet.set_column('K:K', 12, percent_format)
+        # Cost columns are scalar multiples of the quantities; let Excel compute them
+        for row, values in enumerate(block, start=1):
+            xl_row = row + 1
+            detail_sheet.write_datetime(row, 0, dates_list[(row - 1) // n_scenarios])
+            detail_sheet.write_string(row, 1, scenarios[(row - 1) % n_scenarios][0])
+            detail_sheet.write_row(row, 2, values)
+            # Computed results are cached with the formulas for readers that do not recalculate
+            diesel_cost = values[5] * diesel_price
+            v2g_cost = values[4] * v2g_price
+            detail_sheet.write_formula(row, 8, f'=H{xl_row}*{diesel_price}', None, diesel_cost)
+            detail_sheet.write_formula(row, 9, f'=G{xl_row}*{v2g_price}', None, v2g_cost)
+            detail_sheet.write_formula(row, 10, f'=I{xl_row}+J{xl_row}', None, diesel_cost + v2g_cost)
+            if has_savings and row % 2 == 1:
+                without = block[row]
+                cost_without = without[5] * diesel_price + without[4] * v2g_price
+                savings = cost_without - diesel_cost - v2g_cost
+                savings_total += savings
+                detail_sheet.write_formula(row, 11, f'=K{xl_row + 1}-K{xl_row}', None, savings)
         
-        # Write headers with format
-        for col_num, value in enumerate(df_comparison.columns.values):
-            comparison_sheet.write(0, col_num, value, header_format)
-            
-        # Add conditional formatting for savings
-        comparison_sheet.conditional_format(f'G2:G{len(df_comparison)+1}', {
-            'type': '3_color_scale',
-            'min_color': "#FFFFFF",
-            'mid_color': "#B7E1CD",
-            'max_color': "#009E73"
-        })
-        
-        comparison_sheet.conditional_format(f'J2:J{len(df_comparison)+1}', {
-            'type': '3_color_scale',
-            'min_color': "#FFFFFF",
-            'mid_color': "#B7E1CD",
-            'max_color': "#009E73"
-        })
+        detail_sheet.autofilter(0, 0, last_row - 1, last_col)
         
-        # Add totals row
-        total_row = len(df_comparison) + 1
-        comparison_sheet.write(total_row, 0, "TOTAL", total_format)
-        comparison_sheet.write_formula(total_row, 4, f'=SUM(E2:E{total_row})', total_format)
-        comparison_sheet.write_formula(total_row, 5, f'=SUM(F2:F{total_row})', total_format)
-        comparison_sheet.write_formula(total_row, 6, f'=SUM(G2:G{total_row})', total_format)
-        comparison_sheet.write_formula(total_row, 7, f'=SUM(H2:H{total_row})', total_currency_format)
-        comparison_sheet.write_formula(total_row, 8, f'=SUM(I2:I{total_row})', total_currency_format)
-        comparison_sheet.write_formula(total_row, 9, f'=SUM(J2:J{total_row})', total_currency_format)
-        comparison_sheet.write_formula(total_row, 10, f'=J{total_row+1}/I{total_row+1}', percent_format)
+        # Add one totals row per scenario
+        for i, (name, v2g_used, results) in enumerate(scenarios):
+            total_row = last_row + i
+            load_total = float(load_flat.sum(dtype=np.float64))
+            solar_total = float(np.sum(results['solar_used'], dtype=np.float64))
+            v2g_total = float(np.sum(v2g_used, dtype=np.float64))
+            diesel_total = float(np.sum(results['diesel_used'], dtype=np.float64))
+            totals = [load_total, solar_total, v2g_total, diesel_total, diesel_total * diesel_price,
+                      v2g_total * v2g_price, diesel_total * diesel_price + v2g_total * v2g_price]
+            detail_sheet.write(total_row, 0, f"TOTAL ({name})", total_format)
+            for col, total in zip('EFGHIJK', totals):
+                detail_sheet.write_formula(f'{col}{total_row + 1}',
+                                           f'=SUMIF($B$2:$B${last_row},"{name}",{col}2:{col}{last_row})',
+                                           total_format if col < 'I' else total_currency_format, total)
+            if has_savings and i == 0:
+                detail_sheet.write_formula(f'L{total_row + 1}', f'=SUM(L2:L{last_row})',
+                                           total_currency_format, savings_total)
     
     # Create daily summary
     if results_with_v2g and results_without_v2g:
-        # Create datetime objects for grouping
-        date_only = [d.date() for d in date_range]
+        # One columnar frame, aggregated per calendar day in a single groupby
+        hourly = pd.DataFrame({
+            'day': date_only_arr,
+            'load': load_flat,
+            'solar': results_with_v2g['solar_used'],
+            'v2g': results_with_v2g['v2g_used'],
+            'diesel_w': results_with_v2g['diesel_used'],
+            'diesel_wo': results_without_v2g['diesel_used']
+        })
+        agg = hourly.groupby('day', sort=True).sum().astype(np.float64)
+        
+        cost_with_v2g = agg['diesel_w'] * diesel_price + agg['v2g'] * v2g_price
+        cost_without_v2g = agg['diesel_wo'] * diesel_price
+        cost_savings = cost_without_v2g - cost_with_v2g
         
         daily_summary_data = {
-            "Day": [],
-            "Load (MWh)": [],
-            "Solar Used (MWh)": [],
-            "V2G Used (MWh)": [],
-            "Diesel Used (with V2G) (MWh)": [],
-            "Diesel Used (without V2G) (MWh)": [],
-            "Diesel Savings (MWh)": [],
-            "Cost (with V2G) (MAD)": [],
-            "Cost (without V2G) (MAD)": [],
-            "Cost Savings (MAD)": [],
-            "Savings (%)": []
+            "Day": agg.index.strftime('%Y-%m-%d'),  # text labels; no per-cell date format
+            "Load (MWh)": agg['load'],
+            "Solar Used (MWh)": agg['solar'],
+            "V2G Used (MWh)": agg['v2g'],
+            "Diesel Used (with V2G) (MWh)": agg['diesel_w'],
+            "Diesel Used (without V2G) (MWh)": agg['diesel_wo'],
+            "Diesel Savings (MWh)": agg['diesel_wo'] - agg['diesel_w'],
+            "Cost (with V2G) (MAD)": cost_with_v2g,
+            "Cost (without V2G) (MAD)": cost_without_v2g,
+            "Cost Savings (MAD)": cost_savings,
+            "Savings (%)": (cost_savings / cost_without_v2g).where(cost_without_v2g > 0, 0)
         }
         
-        # Group by day
-        unique_days = sorted(set(date_only))
-        
-        for day in unique_days:
-            indices = [i for i, d in enumerate(date_only) if d == day]
-            
-            daily_summary_data["Day"].append(day)
-            daily_summary_data["Load (MWh)"].append(sum(load_pred.flatten()[indices]))
-            daily_summary_data["Solar Used (MWh)"].append(sum(results_with_v2g['solar_used'][indices]))
-            daily_summary_data["V2G Used (MWh)"].append(sum(results_with_v2g['v2g_used'][indices]))
-            daily_summary_data["Diesel Used (with V2G) (MWh)"].append(sum(results_with_v2g['diesel_used'][indices]))
-            daily_summary_data["Diesel Used (without V2G) (MWh)"].append(sum(results_without_v2g['diesel_used'][indices]))
-            
-            diesel_savings = sum(results_without_v2g['diesel_used'][indices]) - sum(results_with_v2g['diesel_used'][indices])
-            daily_summary_data["Diesel Savings (MWh)"].append(diesel_savings)
-            
-            cost_with_v2g = sum(results_with_v2g['diesel_used'][indices]) * diesel_price + sum(results_with_v2g['v2g_used'][indices]) * v2g_price
-            cost_without_v2g = sum(results_without_v2g['diesel_used'][indices]) * diesel_price
-            
-            daily_summary_data["Cost (with V2G) (MAD)"].append(cost_with_v2g)
-            daily_summary_data["Cost (without V2G) (MAD)"].append(cost_without_v2g)
-            
-            cost_savings = cost_without_v2g - cost_with_v2g
-            daily_summary_data["Cost Savings (MAD)"].append(cost_savings)
-            
-            if cost_without_v2g > 0:
-                savings_percent = cost_savings / cost_without_v2g
-            else:
-                savings_percent = 0
-                
-            daily_summary_data["Savings (%)"].append(savings_percent)
+        n_days = len(agg)
         
-        # Create DataFrame and write to Excel
-        daily_df = pd.DataFrame(daily_summary_data)
-        daily_df.to_excel(writer, sheet_name='Daily Summary', index=False)
-        
-        # Format Daily Summary sheet
-        daily_sheet = writer.sheets['Daily Summary']
+        daily_sheet = workbook.add_worksheet('Daily Summary')
         daily_sheet.set_column('A:A', 15)
         daily_sheet.set_column('B:G', 18, number_format)
         daily_sheet.set_column('H:J', 25, currency_format)
         daily_sheet.set_column('K:K', 15, percent_format)
         
-        # Write headers with format
-        for col_num, value in enumerate(daily_df.columns.values):
-            daily_sheet.write(0, col_num, value, header_format)
-            
+        daily_sheet.write_row(0, 0, list(daily_summary_data), header_format)
+        columns = [np.asarray(values).tolist() for values in daily_summary_data.values()]
+        for row, values in enumerate(zip(*columns), start=1):
+            daily_sheet.write_row(row, 0, values)
+        
         # Add chart for daily comparison
         chart = workbook.add_chart({'type': 'column'})
         
         # Add series to chart
         chart.add_series({
             'name': 'Cost (with V2G)',
-            'categories': ['Daily Summary', 1, 0, len(daily_df), 0],
-            'values': ['Daily Summary', 1, 7, len(daily_df), 7],
+            'categories': ['Daily Summary', 1, 0, n_days, 0],
+            'values': ['Daily Summary', 1, 7, n_days, 7],
             'fill': {'color': '#3B82F6'}
         })
         
         chart.add_series({
             'name': 'Cost (without V2G)',
-            'categories': ['Daily Summary', 1, 0, len(daily_df), 0],
-            'values': ['Daily Summary', 1, 8, len(daily_df), 8],
+            'categories': ['Daily Summary', 1, 0, n_days, 0],
+            'values': ['Daily Summary', 1, 8, n_days, 8],
             'fill': {'color': '#DC3545'}
         })
         
@@ -396,11 +338,11 @@ def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_
         daily_sheet.insert_chart('M2', chart, {'x_scale': 1.5, 'y_scale': 1.5})
         
         # Add totals row
-        total_row = len(daily_df) + 1
-        daily_sheet.write(total_row, 0, "TOTAL", total_format)
+        daily_total_row = n_days + 1
+        daily_sheet.write(daily_total_row, 0, "TOTAL", total_format)
         for col in range(1, 10):
-            daily_sheet.write_formula(total_row, col, f'=SUM({chr(65+col)}2:{chr(65+col)}{total_row})', total_format if col < 7 else total_currency_format)
-        daily_sheet.write_formula(total_row, 10, f'=J{total_row+1}/I{total_row+1}', percent_format)
+            daily_sheet.write_formula(daily_total_row, col, f'=SUM({chr(65+col)}2:{chr(65+col)}{daily_total_row})', total_format if col < 7 else total_currency_format)
+        daily_sheet.write_formula(daily_total_row, 10, f'=J{daily_total_row+1}/I{daily_total_row+1}', percent_format)
     
     # Close the writer and return the Excel file
     writer.close()
@@ -408,7 +350,13 @@ def create_excel_report(results_with_v2g, results_without_v2g, date_range, load_
     
     return output
 
-@st.cache_data
+def _results_key(results):
+    """Cache key from the only result fields the recommendations read."""
+    v2g_used = results.get('v2g_used')
+    return (results.get('total_cost'), results.get('total_diesel_energy'),
+            None if v2g_used is None else v2g_used.tobytes())
+
+@st.cache_data(hash_funcs={dict: _results_key})
 def get_user_recommendations(results_with_v2g, results_without_v2g, v2g_price, diesel_price, max_v2g_hours):
     """
     Generate customized recommendations based on optimization results.
@@ -461,8 +409,10 @@ def get_user_recommendations(results_with_v2g, results_without_v2g, v2g_price, d
     
     # V2G utilization assessment
     v2g_usage = results_with_v2g['v2g_used']
-    peak_v2g_usage = max(v2g_usage) if len(v2g_usage) > 0 else 0
-    avg_v2g_usage = np.mean(v2g_usage[v2g_usage > 0]) if sum(v2g_usage > 0) > 0 else 0
+    peak_v2g_usage = v2g_usage.max() if v2g_usage.size else 0
+    # Usage is never negative, so the full sum is the sum over the active hours
+    active_hours = np.count_nonzero(v2g_usage > 0)
+    avg_v2g_usage = v2g_usage.sum() / active_hours if active_hours else 0
     
     if peak_v2g_usage > 0 and avg_v2g_usage / peak_v2g_usage < 0.5:
         recommendations.append("V2G usage is inconsistent. Consider optimizing the availability schedule to better match peak demand periods.")
@@ -1,10 +1,211 @@
+from collections import namedtuple
 import numpy as np
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
 import pandas as pd
+import streamlit as st
+from utils import DATETIME_HASH_FUNCS
 
+# Figures are pure functions of their inputs, so reruns with unchanged data are
+# served from the cache, which keeps the 32 most recent figures per builder
+
+# WebGL only pays off for long series; short or zoomed-in ones render better as SVG
+_WEBGL_MIN_POINTS = 1000
+
+def _line_trace(n_points):
+    """Scatter trace class for a line of n_points samples."""
+    return go.Scattergl if n_points >= _WEBGL_MIN_POINTS else go.Scatter
+
+# Line styles and layout pieces shared across figures; Plotly copies them into
+# each figure, so they are never modified in place
+_LINE_LOAD = dict(color='#0068c9', width=2)
+_LINE_LOAD_DOT = dict(_LINE_LOAD, dash='dot')
+_LINE_LOAD_DASH = dict(_LINE_LOAD, dash='dash')
+_LINE_SOLAR = dict(color='#f8b83c', width=2)
+_LINE_SOLAR_DOT = dict(_LINE_SOLAR, dash='dot')
+_LINE_EV = dict(color='#39a275', width=2)  # EV availability and V2G share a colour
+_LINE_EV_DOT = dict(_LINE_EV, dash='dot')
+_LINE_DIESEL = dict(color='#dc3545', width=2)
+_LINE_DIESEL_WITHOUT = dict(color='#9a031e', width=2, dash='dot')
+
+_LEGEND_TOP = dict(orientation="h", yanchor="bottom", y=1.05, xanchor="center", x=0.5)
+_MARGIN = dict(l=20, r=20, t=80, b=20)
+
+# Assigning a template to a validated figure re-validates every trace type in it,
+# which costs more than building the rest of the figure
+_TEMPLATE = pio.templates["plotly_white"]
+
+def _with_template(fig):
+    """
+    Copy of a finished figure with the plotly_white template attached.
+    
+    The figure content has already been validated while it was built, so the copy
+    skips validation and the template is attached as is.
+    """
+    spec = fig.to_dict()
+    spec['layout'].pop('template', None)
+    out = go.Figure(spec, _validate=False)
+    out.layout.template = _TEMPLATE
+    return out
+
+# Layouts of the single-plot figures, validated once at import; go.Figure copies
+# them, so each call gets its own layout without re-validating literal dicts
+_OPTIMIZATION_LAYOUT = go.Layout(
+    title="Energy Source Usage Over Time",
+    xaxis=dict(
+        title="Time",
+        rangeslider=dict(visible=True),
+        type="date"
+    ),
+    yaxis_title="Power (MW)",
+    legend=_LEGEND_TOP,
+    margin=dict(l=20, r=20, t=70, b=20),
+    hovermode="x unified"
+)
+
+# With nothing but the load line to show, the range slider is dropped
+_OPTIMIZATION_LAYOUT_LOAD_ONLY = go.Layout(
+    _OPTIMIZATION_LAYOUT,
+    xaxis_rangeslider_visible=False
+)
+
+_COST_LAYOUT = go.Layout(
+    xaxis_title="Scenario",
+    yaxis_title="Cost (MAD)",
+    barmode="stack",
+    margin=_MARGIN,
+    legend=_LEGEND_TOP
+)
+
+# Longer series are cut down to this many points before they reach the browser
+_LTTB_THRESHOLD = 4000
+_LTTB_POINTS = 2000
+
+def _lttb_indices(x, y, n_out=_LTTB_POINTS):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+    
+    Parameters
+    ----------
+    x : array-like
+        Sample positions (numeric or datetime64), sorted.
+    y : array-like
+        Sample values.
+    n_out : int
+        Number of points to keep, first and last included.
+    
+    Returns
+    -------
+    np.ndarray
+        Sorted indices into x and y.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x).astype(np.int64).astype(np.float64)
+    y = np.asarray(y, dtype=np.float64).ravel()
+    
+    # Interior points split into n_out - 2 buckets; the ends are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    x_mean = np.add.reduceat(x[1:-1], edges[:-1] - 1) / np.diff(edges)
+    y_mean = np.add.reduceat(y[1:-1], edges[:-1] - 1) / np.diff(edges)
+    x_mean = np.append(x_mean, x[-1])
+    y_mean = np.append(y_mean, y[-1])
+    
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Point of the bucket spanning the largest triangle with the last kept
+        # point and the mean of the next bucket
+        area = np.abs(
+            (x[a] - x_mean[i + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (y_mean[i + 1] - y[a])
+        )
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+def _downsample(x, y, x_labels=None):
+    """
+    Trace x/y keyword arguments, reduced with LTTB when the series is too long to plot as is.
+    
+    x_labels, when given, is passed to the trace in place of x (aligned with it).
+    """
+    x_labels = x if x_labels is None else x_labels
+    if len(y) <= _LTTB_THRESHOLD:
+        return dict(x=x_labels, y=_y32(y))
+    keep = _lttb_indices(x, y)
+    return dict(x=np.asarray(x_labels)[keep], y=_y32(np.asarray(y).ravel()[keep]))
+
+def _y32(values):
+    """
+    Trace y values rounded to float32 precision.
+    
+    Plotly writes floats in JSON with their full float64 repr, so a float32 reading
+    such as 305.92447 goes out as 305.9244689941406. Passing each value's shortest
+    float32 decimal instead halves the digits sent without changing the float32 value.
+    """
+    return np.asarray(values, dtype=np.float32).ravel().astype(str).astype(np.float64)
+
+def _iso_dates(dates):
+    """
+    Timestamps as an object array of ISO strings, ready for trace x values.
+    
+    Plotly serializes a DatetimeIndex by boxing every element, once per trace;
+    formatting it once up front produces the same JSON for all traces sharing it.
+    """
+    return np.datetime_as_string(pd.DatetimeIndex(dates).values, unit='s').astype(object)
+
+# Scenario totals shared by the distribution and cost charts
+ScenarioSummary = namedtuple(
+    'ScenarioSummary',
+    'solar_with v2g_energy diesel_with solar_without diesel_without '
+    'diesel_cost_with v2g_cost total_cost_with diesel_cost_without savings percent_savings'
+)
+
+def _summarize(results_with_v2g, results_without_v2g):
+    """Read the scenario totals out of both result dicts in a single pass."""
+    diesel_cost_without = results_without_v2g['total_diesel_cost']
+    total_cost_with = results_with_v2g['total_cost']
+    savings = diesel_cost_without - total_cost_with
+    return ScenarioSummary(
+        solar_with=np.add.reduce(np.ravel(results_with_v2g['solar_used'])),
+        v2g_energy=results_with_v2g['total_v2g_energy'],
+        diesel_with=results_with_v2g['total_diesel_energy'],
+        solar_without=np.add.reduce(np.ravel(results_without_v2g['solar_used'])),
+        diesel_without=results_without_v2g['total_diesel_energy'],
+        diesel_cost_with=results_with_v2g['total_diesel_cost'],
+        v2g_cost=results_with_v2g['total_v2g_cost'],
+        total_cost_with=total_cost_with,
+        diesel_cost_without=diesel_cost_without,
+        savings=savings,
+        percent_savings=(savings / diesel_cost_without) * 100
+    )
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=DATETIME_HASH_FUNCS)
 def plot_predictions_with_historical(date_range, load_pred, solar_energy_pred, ev_pred_inv, historical_data):
     """Create an interactive plot comparing forecasts with historical data."""
+    # Flat views of the forecasts (no copy for contiguous model outputs)
+    load_flat = np.asarray(load_pred).ravel()
+    solar_flat = np.asarray(solar_energy_pred).ravel()
+    ev_flat = np.asarray(ev_pred_inv).ravel()
+    
+    # Historical timestamps are looked up and checked once for every trace and marker
+    hist_dr = historical_data['date_range']
+    has_hist = len(hist_dr) > 0
+    last_historical = hist_dr[-1] if has_hist else None
+    
+    # Axis labels formatted once and shared by the three traces on each time axis
+    date_x = _iso_dates(date_range)
+    hist_x = _iso_dates(hist_dr)
+    
+    ForecastTrace = _line_trace(len(date_range))
+    HistoricalTrace = _line_trace(len(hist_dr))
+    
     fig = make_subplots(rows=3, cols=1, 
                        subplot_titles=("Grid Load Comparison", 
                                      "Solar Generation Comparison",
@@ -12,52 +213,37 @@ def plot_predictions_with_historical(date_range, load_pred, solar_energy_pred, e
                        vertical_spacing=0.1,
                        shared_xaxes=True)
     
-    # Plot Load comparison
-    fig.add_trace(
-        go.Scatter(x=date_range, y=load_pred.flatten(),
-                  name='Load Forecast', line=dict(color='#0068c9', width=2)),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(x=historical_data['date_range'], y=historical_data['load'],
-                  name='Historical Load', line=dict(color='#0068c9', width=2, dash='dot')),
-        row=1, col=1
-    )
-    
-    # Add vertical line separating historical and forecast
-    if len(historical_data['date_range']) > 0:
-        last_historical = historical_data['date_range'].iloc[-1]
-        for row in range(1, 4):
-            fig.add_vline(x=last_historical, line=dict(color='rgba(0,0,0,0.3)', width=1, dash='dash'), row=row, col=1)
-    
-    # Plot Solar comparison
-    fig.add_trace(
-        go.Scatter(x=date_range, y=solar_energy_pred.flatten(),
-                  name='Solar Forecast', line=dict(color='#f8b83c', width=2)),
-        row=2, col=1
-    )
-    fig.add_trace(
-        go.Scatter(x=historical_data['date_range'], y=historical_data['solar'],
-                  name='Historical Solar', line=dict(color='#f8b83c', width=2, dash='dot')),
-        row=2, col=1
-    )
-    
-    # Plot EV comparison
-    fig.add_trace(
-        go.Scatter(x=date_range, y=ev_pred_inv.flatten(),
-                  name='EV Forecast', line=dict(color='#39a275', width=2)),
-        row=3, col=1
-    )
-    fig.add_trace(
-        go.Scatter(x=historical_data['date_range'], y=historical_data['ev'],
-                  name='Historical EV', line=dict(color='#39a275', width=2, dash='dot')),
-        row=3, col=1
-    )
+    # Forecast and history per row, added in one batch
+    fig.add_traces([
+        # Plot Load comparison
+        ForecastTrace(**_downsample(date_range, load_flat, date_x),
+                      name='Load Forecast', line=_LINE_LOAD),
+        HistoricalTrace(**_downsample(hist_dr, historical_data['load'], hist_x),
+                        name='Historical Load', line=_LINE_LOAD_DOT),
+        # Plot Solar comparison
+        ForecastTrace(**_downsample(date_range, solar_flat, date_x),
+                      name='Solar Forecast', line=_LINE_SOLAR),
+        HistoricalTrace(**_downsample(hist_dr, historical_data['solar'], hist_x),
+                        name='Historical Solar', line=_LINE_SOLAR_DOT),
+        # Plot EV comparison
+        ForecastTrace(**_downsample(date_range, ev_flat, date_x),
+                      name='EV Forecast', line=_LINE_EV),
+        HistoricalTrace(**_downsample(hist_dr, historical_data['ev'], hist_x),
+                        name='Historical EV', line=_LINE_EV_DOT)
+    ], rows=[1, 1, 2, 2, 3, 3], cols=1)
+    
+    # Add vertical line separating historical and forecast, one shape across all rows
+    if has_hist:
+        fig.add_shape(
+            type='line', xref='x', x0=last_historical, x1=last_historical,
+            yref='paper', y0=0, y1=1,
+            line=dict(color='rgba(0,0,0,0.3)', width=1, dash='dash')
+        )
     
     # Add annotations explaining the vertical line
     fig.add_annotation(
-        x=last_historical if len(historical_data['date_range']) > 0 else date_range[0],
-        y=max(load_pred.flatten()) * 0.9,
+        x=last_historical if has_hist else date_range[0],
+        y=load_flat.max() * 0.9,
         text="Historical | Forecast",
         showarrow=False,
         font=dict(size=12, color="rgba(0,0,0,0.5)"),
@@ -69,8 +255,7 @@ def plot_predictions_with_historical(date_range, load_pred, solar_energy_pred, e
     fig.update_layout(
         height=800,
         showlegend=True,
-        template="plotly_white",
-        margin=dict(l=20, r=20, t=80, b=20),
+        margin=_MARGIN,
         legend=dict(
             orientation="h",
             yanchor="bottom",
@@ -95,283 +280,237 @@ def plot_predictions_with_historical(date_range, load_pred, solar_energy_pred, e
         )
     )
     
-    return fig
+    return _with_template(fig)
 
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=DATETIME_HASH_FUNCS)
 def plot_optimization_results(results_with_v2g, results_without_v2g, date_range, load_pred):
     """Create an interactive plot for optimization results."""
-    fig = go.Figure()
+    load_flat = np.ravel(load_pred)
+    
+    # Stacked areas need a common x, so every trace keeps the samples LTTB picks
+    # on the load curve, which the stacked sources add up to
+    keep = slice(None)
+    if len(load_flat) > _LTTB_THRESHOLD:
+        keep = _lttb_indices(date_range, load_flat)
+        date_range = date_range[keep]
+    date_x = _iso_dates(date_range)
+    
+    # Stacked areas stay SVG: scattergl has no stackgroup
+    LineTrace = _line_trace(len(date_range))
+    
+    traces = []
     
     # Add load trace
-    fig.add_trace(go.Scatter(
-        x=date_range,
-        y=load_pred.flatten(),
+    traces.append(LineTrace(
+        x=date_x,
+        y=_y32(load_flat[keep]),
         mode='lines',
         name='Grid Load (MW)',
-        line=dict(color='#0068c9', width=2, dash='dash')
+        line=_LINE_LOAD_DASH
     ))
     
     if results_with_v2g:
         # Add solar with V2G
-        fig.add_trace(go.Scatter(
-            x=date_range,
-            y=results_with_v2g['solar_used'],
+        traces.append(go.Scatter(
+            x=date_x,
+            y=_y32(np.ravel(results_with_v2g['solar_used'])[keep]),
             mode='lines',
             name='Solar Used (with V2G)',
-            line=dict(color='#f8b83c', width=2),
+            line=_LINE_SOLAR,
             stackgroup='with_v2g'
         ))
         
         # Add V2G
-        fig.add_trace(go.Scatter(
-            x=date_range,
-            y=results_with_v2g['v2g_used'],
+        traces.append(go.Scatter(
+            x=date_x,
+            y=_y32(np.ravel(results_with_v2g['v2g_used'])[keep]),
             mode='lines',
             name='V2G Used',
-            line=dict(color='#39a275', width=2),
+            line=_LINE_EV,
             stackgroup='with_v2g'
         ))
         
         # Add diesel with V2G
-        fig.add_trace(go.Scatter(
-            x=date_range,
-            y=results_with_v2g['diesel_used'],
+        traces.append(go.Scatter(
+            x=date_x,
+            y=_y32(np.ravel(results_with_v2g['diesel_used'])[keep]),
             mode='lines',
             name='Diesel Used (with V2G)',
-            line=dict(color='#dc3545', width=2),
+            line=_LINE_DIESEL,
             stackgroup='with_v2g'
         ))
     
     if results_without_v2g:
         # Add diesel without V2G
-        fig.add_trace(go.Scatter(
-            x=date_range,
-            y=results_without_v2g['diesel_used'],
+        traces.append(LineTrace(
+            x=date_x,
+            y=_y32(np.ravel(results_without_v2g['diesel_used'])[keep]),
             mode='lines',
             name='Diesel Used (without V2G)',
-            line=dict(color='#9a031e', width=2, dash='dot')
+            line=_LINE_DIESEL_WITHOUT
         ))
     
-    # Update layout
-    fig.update_layout(
-        title="Energy Source Usage Over Time",
-        xaxis_title="Time",
-        yaxis_title="Power (MW)",
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.05,
-            xanchor="center",
-            x=0.5
-        ),
-        template="plotly_white",
-        margin=dict(l=20, r=20, t=70, b=20),
-        hovermode="x unified"
-    )
-    
-    # Add range slider
-    fig.update_layout(
-        xaxis=dict(
-            rangeslider=dict(visible=True),
-            type="date"
-        )
-    )
-    
-    return fig
+    layout = _OPTIMIZATION_LAYOUT if len(traces) > 1 else _OPTIMIZATION_LAYOUT_LOAD_ONLY
+    return _with_template(go.Figure(data=traces, layout=layout))
 
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=DATETIME_HASH_FUNCS)
 def create_energy_distribution_charts(results_with_v2g, results_without_v2g, load_pred):
     """Create energy distribution pie charts."""
     # Calculate energy values
-    solar_energy_with_v2g = np.sum(results_with_v2g['solar_used'])
-    v2g_energy = results_with_v2g['total_v2g_energy']
-    diesel_energy_with_v2g = results_with_v2g['total_diesel_energy']
-    
-    solar_energy_without_v2g = np.sum(results_without_v2g['solar_used'])
-    diesel_energy_without_v2g = results_without_v2g['total_diesel_energy']
+    summary = _summarize(results_with_v2g, results_without_v2g)
+    total_energy = np.add.reduce(np.ravel(load_pred))
+    total_label = f"Total: {total_energy:.2f} MWh"
     
-    total_energy = np.sum(load_pred)
-    
-    # Create subplots
-    fig = make_subplots(
-        rows=1, cols=2,
-        specs=[[{"type": "pie"}, {"type": "pie"}]],
-        subplot_titles=("Energy Sources with V2G", "Energy Sources without V2G")
-    )
-    
-    # Add traces
-    fig.add_trace(
+    # Two pies side by side, each in its own paper domain; no subplot grid needed
+    traces = [
         go.Pie(
             labels=["Solar", "V2G", "Diesel"],
-            values=[solar_energy_with_v2g, v2g_energy, diesel_energy_with_v2g],
+            values=[summary.solar_with, summary.v2g_energy, summary.diesel_with],
             textinfo="percent+label",
             marker=dict(colors=['#f8b83c', '#39a275', '#dc3545']),
             hole=0.4,
             hoverinfo="label+percent+value",
             hovertemplate="%{label}: %{value:.2f} MWh (%{percent})<extra></extra>",
-            pull=[0, 0.05, 0]
+            pull=[0, 0.05, 0],
+            domain=dict(x=[0.0, 0.45], y=[0.0, 1.0])
         ),
-        row=1, col=1
-    )
-    
-    fig.add_trace(
         go.Pie(
             labels=["Solar", "Diesel"],
-            values=[solar_energy_without_v2g, diesel_energy_without_v2g],
+            values=[summary.solar_without, summary.diesel_without],
             textinfo="percent+label",
             marker=dict(colors=['#f8b83c', '#9a031e']),
             hole=0.4,
             hoverinfo="label+percent+value",
             hovertemplate="%{label}: %{value:.2f} MWh (%{percent})<extra></extra>",
-            pull=[0, 0.05]
-        ),
-        row=1, col=2
-    )
-    
-    # Update layout
-    fig.update_layout(
-        title_text="Energy Source Distribution",
-        template="plotly_white",
-        margin=dict(t=80, b=20),
-        annotations=[
-            dict(
-                text=f"Total: {total_energy:.2f} MWh",
-                showarrow=False,
-                x=0.225,
-                y=0.5
-            ),
-            dict(
-                text=f"Total: {total_energy:.2f} MWh",
-                showarrow=False,
-                x=0.775,
-                y=0.5
-            )
-        ]
+            pull=[0, 0.05],
+            domain=dict(x=[0.55, 1.0], y=[0.0, 1.0])
+        )
+    ]
+    
+    # Pie titles above each domain, total energy in each hole
+    annotation_style = dict(showarrow=False, font=dict(size=16), xref="paper", xanchor="center",
+                            yref="paper", yanchor="bottom")
+    annotations = [
+        dict(text="Energy Sources with V2G", x=0.225, y=1.0, **annotation_style),
+        dict(text="Energy Sources without V2G", x=0.775, y=1.0, **annotation_style),
+        dict(text=total_label, x=0.225, y=0.5, **annotation_style),
+        dict(text=total_label, x=0.775, y=0.5, **annotation_style)
+    ]
+    
+    fig = go.Figure(
+        data=traces,
+        layout=dict(
+            title_text="Energy Source Distribution",
+            margin=dict(t=80, b=20),
+            annotations=annotations
+        )
     )
     
-    return fig
+    return _with_template(fig)
 
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=DATETIME_HASH_FUNCS)
 def create_cost_comparison_chart(results_with_v2g, results_without_v2g):
     """Create cost comparison chart."""
     # Calculate costs
-    diesel_cost_with_v2g = results_with_v2g['total_diesel_cost']
-    v2g_cost = results_with_v2g['total_v2g_cost']
-    total_cost_with_v2g = results_with_v2g['total_cost']
-    
-    diesel_cost_without_v2g = results_without_v2g['total_diesel_cost']
+    summary = _summarize(results_with_v2g, results_without_v2g)
     
-    cost_savings = diesel_cost_without_v2g - total_cost_with_v2g
-    percent_savings = (cost_savings / diesel_cost_without_v2g) * 100
-    
-    # Create figure
-    fig = go.Figure()
+    # Create figure; bar labels are formatted client-side from each bar's value
+    traces = []
     
     # Add with V2G costs
-    fig.add_trace(go.Bar(
+    traces.append(go.Bar(
         x=["With V2G"],
-        y=[diesel_cost_with_v2g],
+        y=[summary.diesel_cost_with],
         name="Diesel Cost",
         marker_color="#dc3545",
-        text=f"{diesel_cost_with_v2g:,.0f} MAD",
+        texttemplate="%{y:,.0f} MAD",
         textposition="auto"
     ))
     
-    fig.add_trace(go.Bar(
+    traces.append(go.Bar(
         x=["With V2G"],
-        y=[v2g_cost],
+        y=[summary.v2g_cost],
         name="V2G Cost",
         marker_color="#39a275",
-        text=f"{v2g_cost:,.0f} MAD",
+        texttemplate="%{y:,.0f} MAD",
         textposition="auto"
     ))
     
     # Add without V2G costs
-    fig.add_trace(go.Bar(
+    traces.append(go.Bar(
         x=["Without V2G"],
-        y=[diesel_cost_without_v2g],
+        y=[summary.diesel_cost_without],
         name="Diesel Cost",
         marker_color="#9a031e",
-        text=f"{diesel_cost_without_v2g:,.0f} MAD",
+        texttemplate="%{y:,.0f} MAD",
         textposition="auto"
     ))
     
-    # Update layout
-    fig.update_layout(
-        title=f"Cost Comparison (Savings: {cost_savings:,.0f} MAD, {percent_savings:.1f}%)",
-        xaxis_title="Scenario",
-        yaxis_title="Cost (MAD)",
-        barmode="stack",
-        template="plotly_white",
-        margin=dict(l=20, r=20, t=80, b=20),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.05,
-            xanchor="center",
-            x=0.5
-        )
-    )
+    fig = go.Figure(data=traces, layout=_COST_LAYOUT)
+    fig.update_layout(title=f"Cost Comparison (Savings: {summary.savings:,.0f} MAD, {summary.percent_savings:.1f}%)")
     
-    return fig
+    return _with_template(fig)
 
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=DATETIME_HASH_FUNCS)
 def plot_v2g_usage(date_range, v2g_usage, load_values):
     """Create a plot showing V2G usage patterns."""
-    # Convert boolean mask to indices
-    if isinstance(date_range, pd.Series):
-        date_range = date_range.values
+    # Timestamps may arrive as a Series, an index or a datetime64 array; normalize once
+    dti = pd.DatetimeIndex(date_range)
+    date_x = _iso_dates(dti)
     
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     
-    # Add V2G usage as bars
-    fig.add_trace(
+    fig.add_traces([
+        # Add V2G usage as bars
         go.Bar(
-            x=date_range,
-            y=v2g_usage,
+            x=date_x,
+            y=_y32(v2g_usage),
             name="V2G Usage (MW)",
             marker_color="#39a275",
             opacity=0.7,
             hovertemplate="Time: %{x}<br>V2G Usage: %{y:.2f} MW<extra></extra>"
         ),
-        secondary_y=False
-    )
-    
-    # Add load as line
-    fig.add_trace(
-        go.Scatter(
-            x=date_range,
-            y=load_values,
+        # Add load as line
+        _line_trace(len(dti))(
+            x=date_x,
+            y=_y32(load_values),
             mode="lines",
             name="Grid Load (MW)",
-            line=dict(color="#0068c9", width=2),
+            line=_LINE_LOAD,
             hovertemplate="Time: %{x}<br>Grid Load: %{y:.2f} MW<extra></extra>"
-        ),
-        secondary_y=True
-    )
+        )
+    ], rows=1, cols=1, secondary_ys=[False, True])
     
     # Add peak hour shading
-    peak_hours = [h for h in range(len(date_range)) if pd.to_datetime(date_range[h]).hour in [9, 10, 11, 12, 17, 18, 19, 20]]
-    
-    for i in peak_hours:
-        if i < len(date_range):
-            fig.add_vrect(
-                x0=date_range[i] - pd.Timedelta(minutes=30),
-                x1=date_range[i] + pd.Timedelta(minutes=30),
-                fillcolor="rgba(255, 235, 153, 0.2)",
-                line_width=0,
-                annotation_text="Peak" if i == min(peak_hours) else None,
-                annotation_position="top left"
-            )
+    peak_mask = np.isin(dti.hour, [9, 10, 11, 12, 17, 18, 19, 20])
+    
+    # Peak samples exactly one hour apart merge into a single band
+    joined = peak_mask[1:] & peak_mask[:-1] & (np.diff(dti.asi8) == pd.Timedelta(hours=1).value)
+    starts = np.flatnonzero(peak_mask & ~np.r_[False, joined])
+    ends = np.flatnonzero(peak_mask & ~np.r_[joined, False])
+    
+    # Bands reach half an hour either side of their first and last peak sample;
+    # all of them go into the layout in one update rather than one add_vrect each
+    half_hour = pd.Timedelta(minutes=30)
+    band_x0 = _iso_dates(dti[starts] - half_hour)
+    band_x1 = _iso_dates(dti[ends] + half_hour)
+    fig.update_layout(shapes=[
+        dict(type="rect", xref="x", yref="y domain", x0=x0, x1=x1, y0=0, y1=1,
+             fillcolor="rgba(255, 235, 153, 0.2)", line_width=0)
+        for x0, x1 in zip(band_x0, band_x1)
+    ])
+    if len(band_x0):
+        fig.add_annotation(
+            x=band_x0[0], xref="x", xanchor="left",
+            y=1, yref="y domain", yanchor="top",
+            text="Peak", showarrow=False
+        )
     
     # Update layout
     fig.update_layout(
         title="V2G Usage During Peak Hours",
-        template="plotly_white",
-        margin=dict(l=20, r=20, t=80, b=20),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.05,
-            xanchor="center",
-            x=0.5
-        ),
+        margin=_MARGIN,
+        legend=_LEGEND_TOP,
         hovermode="x unified",
         barmode="relative"
     )
@@ -389,4 +528,4 @@ def plot_v2g_usage(date_range, v2g_usage, load_values):
         )
     )
     
-    return fig
\ No newline at end of file
+    return _with_template(fig)
\ No newline at end of file